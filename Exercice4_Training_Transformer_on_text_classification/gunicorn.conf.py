@@ -0,0 +1,59 @@
+"""
+Gunicorn settings for the emotion classification app.
+
+Run with:
+    gunicorn -c gunicorn.conf.py app:app
+"""
+
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:5000")
+
+# Load app.py (and the HF pipeline) once in the master, then fork the workers
+# so they share the model weights copy-on-write instead of each loading them
+preload_app = True
+
+# Several small workers beat one worker using every core: e.g. 4 workers x
+# 4 torch threads on a 16-core machine. Each worker is pinned to its own cores
+# (see post_fork), so never start more workers than there are cores.
+_cpu_count = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+workers = min(int(os.environ.get("WEB_CONCURRENCY", 4)), _cpu_count or 1)
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+
+# Upper bound on torch intra-op threads per worker, same knob as in app.py
+torch_threads = int(os.environ.get("TORCH_NUM_THREADS", 4))
+
+
+def pre_fork(server, worker):
+    """Give the new worker the first core slot no live worker holds.
+
+    Runs in the master, so the slot is recorded on the worker object the
+    arbiter keeps and is freed again when that worker exits.
+    """
+    # num_workers follows TTIN/TTOU; workers already running keep the cores
+    # they were given until they are recycled
+    slots = range(server.num_workers)
+    in_use = [getattr(w, "core_slot", None) for w in server.WORKERS.values()]
+    # During a reload old and new workers briefly overlap: share the least used slot
+    worker.core_slot = min(slots, key=in_use.count)
+
+
+def post_fork(server, worker):
+    """Pin each worker to its own disjoint set of cores (Linux only)."""
+    if not hasattr(os, "sched_setaffinity"):
+        return
+
+    import torch
+
+    cores = sorted(os.sched_getaffinity(0))
+    if server.num_workers > len(cores):
+        server.log.warning("%d workers for %d cores: some workers share a core",
+                           server.num_workers, len(cores))
+    per_worker = max(1, len(cores) // server.num_workers)
+    start = (worker.core_slot * per_worker) % len(cores)
+    worker_cores = cores[start:start + per_worker]
+    os.sched_setaffinity(0, worker_cores)
+    # At most one intra-op thread per pinned core, so threads never share a core
+    torch.set_num_threads(min(torch_threads, len(worker_cores)))
+    server.log.info("Worker %s pinned to cores %s", os.getpid(), worker_cores)
@@ -9,20 +9,100 @@ This agent uses:
 
 """
 
+import asyncio
+import functools
 import os
-import json
-import requests
-from groq import Groq
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
+
+import httpx
+import ijson
+import orjson
+from cachetools import TTLCache
+from cachetools.keys import hashkey
 from dotenv import load_dotenv
+from groq import AsyncGroq
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Initialize Groq client
-client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
+# Initialize Groq client (async, so several questions can be answered concurrently)
+client = AsyncGroq(api_key=os.environ.get("GROQ_API_KEY"))
+
+class RetryTransport(httpx.HTTPTransport):
+    """HTTP transport that also retries rate limiting and 5xx responses, with backoff."""
+    
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+    
+    def __init__(self, max_retries: int = 3, backoff_factor: float = 0.3, **kwargs):
+        # httpx itself only retries failed connections
+        super().__init__(retries=max_retries, **kwargs)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+    
+    def handle_request(self, request):
+        for attempt in range(self.max_retries + 1):
+            response = super().handle_request(request)
+            if response.status_code not in self.RETRY_STATUSES or attempt == self.max_retries:
+                return response
+            response.close()
+            time.sleep(self.backoff_factor * 2 ** attempt)
+
+
+# Shared HTTP client: one HTTP/2 connection to ClinicalTrials.gov multiplexes
+# concurrent tool calls, and compressed responses cut the bytes transferred
+HTTP_CLIENT = httpx.Client(
+    headers={"Accept-Encoding": "gzip, br"},
+    timeout=15.0,
+    transport=RetryTransport(http2=True)
+)
+
+# Tool results are cached for an hour: the same condition/phase is often asked
+# about several times in one session and the data changes slowly
+CACHE_TTL = 3600
+
+
+def ttl_cached(func):
+    """Memoize a tool function for CACHE_TTL seconds, without caching API errors."""
+    cache = TTLCache(maxsize=1024, ttl=CACHE_TTL)
+    lock = threading.Lock()
+    
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        key = hashkey(*args, **kwargs)
+        with lock:
+            result = cache.get(key)
+        if result is not None:
+            return result
+        
+        result = func(*args, **kwargs)
+        if "error" not in result:
+            with lock:
+                cache[key] = result
+        return result
+    
+    return wrapper
+
+
+def iter_json_items(response: httpx.Response, prefix: str):
+    """Yield the JSON items found at prefix in a streamed response, as they arrive."""
+    items = ijson.sendable_list()
+    parser = ijson.items_coro(items, prefix)
+    for chunk in response.iter_bytes():
+        parser.send(chunk)
+        yield from items
+        del items[:]
+    parser.close()
+    yield from items
+
+# Fetch both identifiers from a study's identificationModule in one call
+nct_id_and_title = itemgetter('nctId', 'briefTitle')
 
 #API queries
 
+@ttl_cached
 def count_trials(condition: str, status: str = "RECRUITING") -> dict:
     """
     Count clinical trials for a specific condition and status.
@@ -34,11 +114,13 @@ def count_trials(condition: str, status: str = "RECRUITING") -> dict:
     Returns:
         Dictionary with count and details
     """
-    response = requests.get(
+    # Let the API count the matches; only the 3 sample titles are downloaded
+    response = HTTP_CLIENT.get(
         "https://clinicaltrials.gov/api/v2/studies",
         params={
             "format": "json",
-            "pageSize": 1000,
+            "countTotal": "true",
+            "pageSize": 3,
             "query.cond": condition,
             "filter.overallStatus": status,
             "fields": "NCTId,BriefTitle"
@@ -50,7 +132,7 @@ def count_trials(condition: str, status: str = "RECRUITING") -> dict:
         studies = data.get('studies', [])
         
         return {
-            "count": len(studies),
+            "count": data.get('totalCount', len(studies)),
             "condition": condition,
             "status": status,
             "sample_titles": [
@@ -62,6 +144,7 @@ def count_trials(condition: str, status: str = "RECRUITING") -> dict:
         return {"error": f"API error: {response.status_code}"}
 
 
+@ttl_cached
 def get_eligibility_criteria(condition: str, max_trials: int = 5) -> dict:
     """
     Get eligibility criteria for trials of a specific condition.
@@ -73,7 +156,7 @@ def get_eligibility_criteria(condition: str, max_trials: int = 5) -> dict:
     Returns:
         Dictionary with eligibility criteria from multiple trials
     """
-    response = requests.get(
+    response = HTTP_CLIENT.get(
         "https://clinicaltrials.gov/api/v2/studies",
         params={
             "format": "json",
@@ -92,10 +175,11 @@ def get_eligibility_criteria(condition: str, max_trials: int = 5) -> dict:
         for study in studies:
             protocol = study['protocolSection']
             eligibility = protocol.get('eligibilityModule', {})
+            nct_id, title = nct_id_and_title(protocol['identificationModule'])
             
             criteria_list.append({
-                "nct_id": protocol['identificationModule']['nctId'],
-                "title": protocol['identificationModule']['briefTitle'],
+                "nct_id": nct_id,
+                "title": title,
                 "criteria": eligibility.get('eligibilityCriteria', 'N/A'),
                 "sex": eligibility.get('sex', 'N/A'),
                 "age_range": f"{eligibility.get('minimumAge', 'N/A')} - {eligibility.get('maximumAge', 'N/A')}"
@@ -110,6 +194,7 @@ def get_eligibility_criteria(condition: str, max_trials: int = 5) -> dict:
         return {"error": f"API error: {response.status_code}"}
 
 
+@ttl_cached
 def get_trial_locations(condition: str, country: str = None) -> dict:
     """
     Get clinical trial locations for a condition, optionally filtered by country.
@@ -131,47 +216,56 @@ def get_trial_locations(condition: str, country: str = None) -> dict:
     if country:
         params["query.locn"] = country
     
-    response = requests.get(
+    with HTTP_CLIENT.stream(
+        "GET",
         "https://clinicaltrials.gov/api/v2/studies",
         params=params
-    )
-    
-    if response.status_code == 200:
-        data = response.json()
-        studies = data.get('studies', [])
+    ) as response:
+        if response.status_code != 200:
+            return {"error": f"API error: {response.status_code}"}
+        
+        # Stream-parse only the location entries instead of building the
+        # whole response as Python objects
+        locations = iter_json_items(
+            response,
+            'studies.item.protocolSection.contactsLocationsModule.locations.item'
+        )
         
         # Collect all unique facilities
         facilities = []
-        for study in studies:
-            protocol = study['protocolSection']
-            if 'contactsLocationsModule' in protocol:
-                locations = protocol['contactsLocationsModule'].get('locations', [])
-                
-                for loc in locations:
-                    # Filter by country if specified
-                    if country and loc.get('country', '').lower() != country.lower():
-                        continue
-                    
-                    facility_info = {
-                        "facility": loc.get('facility', 'N/A'),
-                        "city": loc.get('city', 'N/A'),
-                        "country": loc.get('country', 'N/A')
-                    }
-                    
-                    # Avoid duplicates
-                    if facility_info not in facilities:
-                        facilities.append(facility_info)
-        
-        return {
-            "condition": condition,
-            "country": country or "all",
-            "number_of_facilities": len(facilities),
-            "facilities": facilities[:20]  # Return first 20
-        }
-    else:
-        return {"error": f"API error: {response.status_code}"}
+        seen = set()
+        country_lower = country.lower() if country else None
+        for loc in locations:
+            # Filter by country if specified
+            if country_lower and loc.get('country', '').lower() != country_lower:
+                continue
+            
+            key = (
+                loc.get('facility', 'N/A'),
+                loc.get('city', 'N/A'),
+                loc.get('country', 'N/A')
+            )
+            
+            # Avoid duplicates
+            if key in seen:
+                continue
+            seen.add(key)
+            
+            facilities.append({
+                "facility": key[0],
+                "city": key[1],
+                "country": key[2]
+            })
+    
+    return {
+        "condition": condition,
+        "country": country or "all",
+        "number_of_facilities": len(facilities),
+        "facilities": facilities[:20]  # Return first 20
+    }
 
 
+@ttl_cached
 def get_trial_phases(condition: str, phase: str) -> dict:
     """
     Get trials for a specific condition and phase.
@@ -183,7 +277,7 @@ def get_trial_phases(condition: str, phase: str) -> dict:
     Returns:
         Dictionary with trials in that phase
     """
-    response = requests.get(
+    response = HTTP_CLIENT.get(
         "https://clinicaltrials.gov/api/v2/studies",
         params={
             "format": "json",
@@ -202,10 +296,11 @@ def get_trial_phases(condition: str, phase: str) -> dict:
         for study in studies:
             protocol = study['protocolSection']
             status_module = protocol.get('statusModule', {})
+            nct_id, title = nct_id_and_title(protocol['identificationModule'])
             
             trials.append({
-                "nct_id": protocol['identificationModule']['nctId'],
-                "title": protocol['identificationModule']['briefTitle'],
+                "nct_id": nct_id,
+                "title": title,
                 "phase": protocol.get('designModule', {}).get('phases', ['N/A']),
                 "start_date": status_module.get('startDateStruct', {}).get('date', 'N/A'),
                 "completion_date": status_module.get('completionDateStruct', {}).get('date', 'N/A')
@@ -321,16 +416,25 @@ available_functions = {
     "get_trial_phases": get_trial_phases
 }
 
+# Thread pool used to run several tool calls from one LLM response in parallel
+executor = ThreadPoolExecutor(max_workers=8)
+
 
 #main agent function
 
-def run_agent(user_question: str, model: str = "llama-3.3-70b-versatile") -> str:
+async def run_agent(user_question: str, model: str = "llama-3.3-70b-versatile",
+                    on_token=None) -> str:
     """
-    Run the clinical trials agent with a user question.
+    Run the clinical trials agent with a user question (a coroutine).
+    
+    The tool functions are blocking but cached, so they run on the
+    executor thread pool rather than on the event loop.
     
     Args:
         user_question: Natural language question from user
         model: Groq model to use
+        on_token: Optional callback; if given, the answer is streamed and
+            each piece of text is passed to it as soon as it arrives
     
     Returns:
         Agent's response
@@ -347,7 +451,7 @@ def run_agent(user_question: str, model: str = "llama-3.3-70b-versatile") -> str
     ]
     
     # First call: Let the model decide which tools to use
-    response = client.chat.completions.create(
+    response = await client.chat.completions.create(
         model=model,
         messages=messages,
         tools=tools,
@@ -360,41 +464,77 @@ def run_agent(user_question: str, model: str = "llama-3.3-70b-versatile") -> str
     
     # If no tool calls, return the direct response
     if not tool_calls:
+        if on_token:
+            on_token(response_message.content or "")
         return response_message.content
     
     # Execute the tool calls
     messages.append(response_message)
     
+    # The tool calls are independent HTTP queries, so run them concurrently
+    loop = asyncio.get_running_loop()
+    futures = []
     for tool_call in tool_calls:
         function_name = tool_call.function.name
-        function_args = json.loads(tool_call.function.arguments)
+        function_args = orjson.loads(tool_call.function.arguments)
         
+        # Several questions may be answered at once, so say which one this is for
         print(f"\n🔧 Calling tool: {function_name}")
+        print(f"   Question: {user_question}")
         print(f"   Args: {function_args}")
         
         # Call the actual function
-        function_response = available_functions[function_name](**function_args)
-        
-        # Add function response to messages
+        futures.append(loop.run_in_executor(
+            executor,
+            functools.partial(available_functions[function_name], **function_args)
+        ))
+    
+    # Add function responses to messages, in the original tool call order
+    function_responses = await asyncio.gather(*futures)
+    for tool_call, function_response in zip(tool_calls, function_responses):
         messages.append({
             "role": "tool",
             "tool_call_id": tool_call.id,
-            "name": function_name,
-            "content": json.dumps(function_response)
+            "name": tool_call.function.name,
+            "content": orjson.dumps(function_response).decode()
         })
     
     # Second call: Let the model generate a final response using the tool results
-    final_response = client.chat.completions.create(
+    if on_token is None:
+        final_response = await client.chat.completions.create(
+            model=model,
+            messages=messages,
+            max_tokens=4096
+        )
+        return final_response.choices[0].message.content
+    
+    # Streamed: hand over tokens as they are generated
+    stream = await client.chat.completions.create(
         model=model,
         messages=messages,
-        max_tokens=4096
+        max_tokens=4096,
+        stream=True
     )
     
-    return final_response.choices[0].message.content
+    answer = []
+    async for chunk in stream:
+        token = chunk.choices[0].delta.content or ""
+        answer.append(token)
+        on_token(token)
+    
+    return "".join(answer)
 
 
 #test the agent
 
+async def run_agents(questions: list) -> list:
+    """Answer several questions concurrently; failures are returned as exceptions."""
+    return await asyncio.gather(
+        *(run_agent(question) for question in questions),
+        return_exceptions=True
+    )
+
+
 if __name__ == "__main__":
     print("="*80)
     print("CLINICAL TRIALS AGENT")
@@ -408,31 +548,46 @@ if __name__ == "__main__":
         "Show me Phase 3 Asthma trials",
     ]
     
-    for i, question in enumerate(test_questions, 1):
-        print(f"\n{'='*80}")
-        print(f"QUESTION {i}: {question}")
-        print('='*80)
+    # One event loop for the whole session, so the async Groq client's
+    # connections stay usable between questions; input() stays on the main
+    # thread so Ctrl+C still exits straight away
+    with asyncio.Runner() as runner:
+        # Answer all test questions concurrently, then print them in order
+        answers = runner.run(run_agents(test_questions))
         
-        try:
-            answer = run_agent(question)
-            print(f"\nANSWER:\n{answer}")
-        except Exception as e:
-            print(f"❌ Error: {e}")
+        for i, (question, answer) in enumerate(zip(test_questions, answers), 1):
+            print(f"\n{'='*80}")
+            print(f"QUESTION {i}: {question}")
+            print('='*80)
+            
+            if isinstance(answer, Exception):
+                print(f"❌ Error: {answer}")
+            else:
+                print(f"\nANSWER:\n{answer}")
+            
+            print("\n")
         
-        print("\n")
-    
-    # Interactive mode
-    print("\n" + "="*80)
-    print("INTERACTIVE MODE")
-    print("="*80)
-    
-    while True:
-        question = input("\nYour question: ")
-        if question.lower() in ['quit', 'exit', 'q']:
-            break
+        # Interactive mode
+        print("\n" + "="*80)
+        print("INTERACTIVE MODE")
+        print("="*80)
         
-        try:
-            answer = run_agent(question)
-            print(f" Answer:\n{answer}\n")
-        except Exception as e:
-            print(f"❌ Error: {e}")
\ No newline at end of file
+        while True:
+            question = input("\nYour question: ")
+            if question.lower() in ['quit', 'exit', 'q']:
+                break
+            
+            # Stream the answer so it starts printing right away
+            streamed = []
+            
+            def print_token(token):
+                if not streamed:
+                    print(" Answer:")
+                streamed.append(token)
+                print(token, end="", flush=True)
+            
+            try:
+                runner.run(run_agent(question, on_token=print_token))
+                print("\n")
+            except Exception as e:
+                print(f"❌ Error: {e}")
@@ -5,6 +5,16 @@ Run this on your local machine to see the actual data structure
 
 import requests
 import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# One session for all queries so the connection to the API is reused
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+))
 
 print("="*80)
 print("PART 1: EXPLORING THE API")
@@ -14,7 +24,7 @@ print("="*80)
 print("\n1. BASIC QUERY: Diabetes trials in France")
 print("-" * 80)
 
-response = requests.get(
+response = SESSION.get(
     "https://clinicaltrials.gov/api/v2/studies",
     params={
         "format": "json",
@@ -39,7 +49,7 @@ if data.get('studies'):
 print("\n\n2. COUNTING: How many diabetes trials are recruiting?")
 print("-" * 80)
 
-response = requests.get(
+response = SESSION.get(
     "https://clinicaltrials.gov/api/v2/studies",
     params={
         "format": "json",
@@ -57,7 +67,7 @@ print(f"Count: {len(data.get('studies', []))} trials")
 print("\n\n3. ELIGIBILITY: Ulcerative Colitis criteria")
 print("-" * 80)
 
-response = requests.get(
+response = SESSION.get(
     "https://clinicaltrials.gov/api/v2/studies",
     params={
         "format": "json",
@@ -82,7 +92,7 @@ if data.get('studies'):
 print("\n\n4. LOCATIONS: Depression trials in Spain")
 print("-" * 80)
 
-response = requests.get(
+response = SESSION.get(
     "https://clinicaltrials.gov/api/v2/studies",
     params={
         "format": "json",